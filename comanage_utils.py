@@ -32,6 +32,13 @@ TEST_LDAP_TARGET_ID = 9
 TIMEOUT_BASE = 5
 MAX_ATTEMPTS = 5
 
+# Number of concurrent requests when fanning out read-only API calls. Kept small because the registry
+# rate limits clients, and each throttled request backs off on its own in call_api3 (up to minutes).
+MAX_API_WORKERS = 4
+
+# Number of entries the LDAP server returns per page of a search
+LDAP_PAGE_SIZE = 1000
+
 
 GET    = "GET"
 PUT    = "PUT"
@@ -185,12 +192,23 @@ class LDAPSearch:
         self.connection = Connection(self.server, ldap_user, ldap_authtok, client_strategy=SAFE_SYNC, auto_bind=True)
 
     def search(self, ou, filter_str, attrs):
-        _, _, response, _ = self.connection.search(f"ou={ou},{LDAP_BASE_DN}", filter_str, attributes=attrs)
-        return response
+        return self.connection.extend.standard.paged_search(f"ou={ou},{LDAP_BASE_DN}", filter_str, attributes=attrs,
+                                                             paged_size=LDAP_PAGE_SIZE, generator=False)
+
+
+_ldap_searchers = {}
+
+def get_ldap_searcher(ldap_server, ldap_user, ldap_authtok):
+    """ Return a bound LDAPSearch, reusing an existing connection for the same server and credentials. """
+    key = (ldap_server, ldap_user, ldap_authtok)
+    if key not in _ldap_searchers:
+        _ldap_searchers[key] = LDAPSearch(ldap_server, ldap_user, ldap_authtok)
+    return _ldap_searchers[key]
+
 
 def get_ldap_groups(ldap_server, ldap_user, ldap_authtok):
     ldap_group_osggids = set()
-    searcher = LDAPSearch(ldap_server, ldap_user, ldap_authtok)
+    searcher = get_ldap_searcher(ldap_server, ldap_user, ldap_authtok)
     response = searcher.search("groups", "(cn=*)", ["gidNumber"])
     for group in response:
         ldap_group_osggids.add(group["attributes"]["gidNumber"])
@@ -203,7 +221,7 @@ def get_ldap_active_users_and_groups(ldap_server, ldap_user, ldap_authtok, filte
     filter_str = ("(isMemberOf=CO:members:active)" if filter_group_name is None 
                   else f"(&(isMemberOf={filter_group_name})(isMemberOf=CO:members:active))")
 
-    searcher = LDAPSearch(ldap_server, ldap_user, ldap_authtok)
+    searcher = get_ldap_searcher(ldap_server, ldap_user, ldap_authtok)
     response = searcher.search("people", filter_str, ["employeeNumber", "isMemberOf"])
 
     for person in response:
@@ -284,10 +302,15 @@ def provision_group_members(gid, prov_id, endpoint, authstr):
         "Version"     : "1.0",
         "Synchronous" : True
     }
+    # A person may be listed more than once (eg, as both member and owner); provision each only once
+    pids = list(dict.fromkeys(
+        member["Person"]["Id"]
+        for member in get_co_group_members(gid, endpoint, authstr)["CoGroupMembers"]
+        if member["Person"]["Type"] == "CO"
+    ))
+    # Provisioning requests are synchronous writes on the registry side, so they are sent one at a time
     responses = {}
-    for member in get_co_group_members(gid, endpoint, authstr)["CoGroupMembers"]:
-        if member["Person"]["Type"] == "CO":
-            pid = member["Person"]["Id"]
-            path = f"co_provisioning_targets/provision/{prov_id}/copersonid:{pid}.json"
-            responses[pid] = call_api3(POST, path, data, endpoint, authstr)
+    for pid in pids:
+        path = f"co_provisioning_targets/provision/{prov_id}/copersonid:{pid}.json"
+        responses[pid] = call_api3(POST, path, data, endpoint, authstr)
     return responses
@@ -84,6 +84,11 @@ def get_misnamed_unixcluster_groups():
              if "UnixCluster Group" in g["Name"] ]
 
 
+def get_group_identifiers(gid):
+    resp_data = utils.get_co_group_identifiers(gid, options.endpoint, options.authstr)
+    return utils.get_datalist(resp_data, "Identifiers")
+
+
 def _osgid_sortkey(i):
     return int(i["Identifier"])
 
@@ -113,13 +118,13 @@ def get_fixed_unixcluster_group_name(name):
 # display functions
 
 
-def show_misnamed_unixcluster_group(group):
+def show_misnamed_unixcluster_group(group, identifiers=None):
     print('CO {CoId} Group {Id}: "{Name}"'.format(**group))
     oldname = group["Name"]
     newname = get_fixed_unixcluster_group_name(oldname)
     if oldname != newname:
         print('  ** Rename group to: "%s"' % newname)
-    show_group_identifiers(group["Id"])
+    show_group_identifiers(group["Id"], identifiers)
     print("")
 
 
@@ -140,9 +145,9 @@ def show_misnamed_unixcluster_groups():
         show_misnamed_unixcluster_group(group)
 
 
-def show_group_identifiers(gid):
-    resp_data = utils.get_co_group_identifiers(gid, options.endpoint, options.authstr)
-    identifiers = utils.get_datalist(resp_data, "Identifiers")
+def show_group_identifiers(gid, identifiers=None):
+    if identifiers is None:
+        identifiers = get_group_identifiers(gid)
     for i in identifiers:
         print('   - Identifier {Id}: ({Type}) "{Identifier}"'.format(**i))
 
@@ -158,11 +163,10 @@ def fixup_unixcluster_group(gid):
     group = utils.get_co_group(gid, options.endpoint, options.authstr)
     oldname = group["Name"]
     newname = get_fixed_unixcluster_group_name(oldname)
-    resp_data = utils.get_co_group_identifiers(gid, options.endpoint, options.authstr)
-    identifiers = utils.get_datalist(resp_data, "Identifiers")
+    identifiers = get_group_identifiers(gid)
     ids_to_delete = get_identifiers_to_delete(identifiers)
 
-    show_misnamed_unixcluster_group(group)
+    show_misnamed_unixcluster_group(group, identifiers)
     if oldname != newname:
         utils.rename_co_group(gid, group, newname, options.endpoint, options.authstr)
     for id_ in ids_to_delete:
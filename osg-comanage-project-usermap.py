@@ -3,9 +3,21 @@
 import os
 import re
 import sys
+import json
+import time
 import getopt
+import tempfile
 import requests
+import collections
 import comanage_utils as utils
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # orjson decodes the (multi-MB) topology data considerably faster than the stdlib
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 
 SCRIPT = os.path.basename(__file__)
@@ -14,8 +26,18 @@ TOPOLOGY_ENDPOINT = "https://topology.opensciencegrid.org/"
 LDAP_SERVER = "ldaps://ldap-test.cilogon.org"
 LDAP_USER = "uid=registry_user,ou=system,o=OSG,o=CO,dc=cilogon,dc=org"
 OSG_CO_ID = 8
-CACHE_FILENAME = "COmanage_Projects_cache.txt"
 CACHE_LIFETIME_HOURS = 0.5
+TOPOLOGY_CACHE_FILENAME = "topology_cache.json"
+
+# Delimiters between groups in the last column of an HTCondor mapfile line
+_SPLIT_RE = re.compile(r'[ ,]+')
+
+# Shared HTTP session so repeated requests reuse pooled keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64,
+                       max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 
 _usage = f"""\
@@ -35,6 +57,8 @@ OPTIONS:
   -g filter_group     filter users by group name (eg, 'ap1-login')
   -m localmaps        specify a comma-delimited list of local HTCondor mapfiles to merge into outfile
   -n min_users        Specify minimum number of users required to update the output file (default: 100)
+  -t topology_cache   specify path of the topology data cache file
+                        (default = {TOPOLOGY_CACHE_FILENAME})
   -h                  display this help text
 
 PASS for USER is taken from the first of:
@@ -64,6 +88,7 @@ class Options:
     filtergrp = None
     min_users = 100 # Bail out before updating the file if we have fewer than this many users
     localmaps = []
+    topology_cache = TOPOLOGY_CACHE_FILENAME
 
 
 options = Options()
@@ -80,7 +105,7 @@ def get_osg_co_groups__map():
 
 def parse_options(args):
     try:
-        ops, args = getopt.getopt(args, 'u:c:s:l:a:d:f:g:e:o:h:n:m:')
+        ops, args = getopt.getopt(args, 'u:c:s:l:a:d:f:g:e:o:h:n:m:t:')
     except getopt.GetoptError:
         usage()
 
@@ -105,6 +130,7 @@ def parse_options(args):
         if op == '-g': options.filtergrp  = arg
         if op == '-m': options.localmaps  = arg.split(",")
         if op == '-n': options.min_users  = int(arg)
+        if op == '-t': options.topology_cache = arg
 
     try:
         user, passwd = utils.getpw(options.user, passfd, passfile)
@@ -113,61 +139,166 @@ def parse_options(args):
     except PermissionError:
         usage("PASS required")
 
-def _deduplicate_list(items):
-    """ Deduplicate a list while maintaining order by converting it to a dictionary and then back to a list. 
-    Used to ensure a consistent ordering for output group lists, since sets are unordered.
+def _write_file_atomic(path, data):
+    """ Write bytes to a temporary file and move it into place, so readers never see a partial file. """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_topology_cache(content, resp_headers):
+    """ Save the topology cache; failing to do so only costs a refetch on the next run, so it is not fatal. """
+    validators = {"etag": resp_headers.get("ETag"), "last_modified": resp_headers.get("Last-Modified")}
+    try:
+        # Drop the old validators before replacing the body, and only write the new ones once the body is in
+        # place, so a failed write can never pair new validators with an old body
+        if os.path.exists(options.topology_cache + ".meta"):
+            os.unlink(options.topology_cache + ".meta")
+        _write_file_atomic(options.topology_cache, content)
+        _write_file_atomic(options.topology_cache + ".meta", json.dumps(validators).encode("utf-8"))
+    except OSError as e:
+        print(f"Unable to write topology cache: {e}", file=sys.stderr)
+
+
+def get_topology_projects():
+    """ Retrieve the topology project data, using a local cache that is refreshed every CACHE_LIFETIME_HOURS.
+    The cache holds the raw response body; its ETag and Last-Modified are kept in a small ".meta" sidecar,
+    so that expired caches can be revalidated with a conditional GET and unchanged data is not downloaded again.
     """
-    return list(dict.fromkeys(items))
+    cached_projects = None
+    validators = dict()
+    if os.path.exists(options.topology_cache):
+        try:
+            with open(options.topology_cache, "rb") as file:
+                cached_projects = json_loads(file.read())
+            if os.path.getmtime(options.topology_cache) > time.time() - CACHE_LIFETIME_HOURS * 3600:
+                return cached_projects
+            if os.path.exists(options.topology_cache + ".meta"):
+                with open(options.topology_cache + ".meta", "r", encoding="utf-8") as file:
+                    validators = json.load(file)
+        except ValueError:
+            # Undecodable cache, fetch from scratch
+            cached_projects = None
+        except OSError as e:
+            print(f"Unable to read topology cache, fetching from {TOPOLOGY_ENDPOINT}: {e}", file=sys.stderr)
+            cached_projects = None
+
+    headers = dict()
+    if cached_projects is not None and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if cached_projects is not None and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    resp = SESSION.get(f"{TOPOLOGY_ENDPOINT}/miscproject/json", headers=headers, timeout=utils.TIMEOUT_BASE)
+    if resp.status_code == 304 and headers:
+        try:
+            # Unchanged upstream, so just mark the existing cache as fresh again
+            os.utime(options.topology_cache)
+        except OSError as e:
+            print(f"Unable to refresh topology cache: {e}", file=sys.stderr)
+        return cached_projects
+    resp.raise_for_status()
+
+    projects = json_loads(resp.content)
+    _write_topology_cache(resp.content, resp.headers)
+    return projects
+
 
 def get_osguser_groups(filter_group_name=None):
     ldap_users = utils.get_ldap_active_users_and_groups(options.ldap_server, options.ldap_user, options.ldap_authtok, filter_group_name)
-    topology_projects = requests.get(f"{TOPOLOGY_ENDPOINT}/miscproject/json").json()
-    project_names = topology_projects.keys()
-    
+    topology_projects = get_topology_projects()
+    project_names = frozenset(topology_projects)
+
     # Get COManage group IDs to preserve ordering from pre-LDAP migration script behavior
     groups_ids = get_osg_co_groups__map()
-    return {
-        user: sorted([g for g in groups if g in project_names], key = lambda g: groups_ids.get(g, 0)) 
-        for user, groups in ldap_users.items()
-        if any(g in project_names for g in groups)
-    }
+    # Sort rank for every project, so sorting needs no per-comparison fallback for groups missing from COManage
+    project_rank = {name: groups_ids.get(name, 0) for name in project_names}
+    osguser_groups = dict()
+    for user, groups in ldap_users.items():
+        project_groups = [g for g in groups if g in project_names]
+        if project_groups:
+            osguser_groups[user] = sorted(project_groups, key=project_rank.__getitem__)
+    return osguser_groups
 
 
 def parse_localmap(inputfile):
-    user_groupmap = dict()
+    # Each user's groups are kept in a dict, used as an ordered set
+    user_groupmap = collections.defaultdict(dict)
     with open(inputfile, 'r', encoding='utf-8') as file:
-        for line in file:
-            # Split up 3 semantic columns
-            split_line = line.strip().split(maxsplit=2)
-            if split_line[0] == "*" and len(split_line) == 3:
-                line_groups = re.split(r'[ ,]+', split_line[2])
-                if split_line[1] in user_groupmap:
-                    user_groupmap[split_line[1]] = _deduplicate_list(user_groupmap[split_line[1]] + line_groups)
-                else:
-                    user_groupmap[split_line[1]] = line_groups
-    return user_groupmap
+        lines = file.read().splitlines()
+    for line in lines:
+        # Split up 3 semantic columns
+        split_line = line.split(maxsplit=2)
+        if len(split_line) < 3 or split_line[0] != "*":
+            continue
+        # Groups are normalized here so they never need stripping on output
+        line_groups = [g for g in _SPLIT_RE.split(split_line[2].rstrip()) if g]
+        user_groupmap[split_line[1]].update(dict.fromkeys(line_groups))
+    return {user: list(groups) for user, groups in user_groupmap.items()}
 
 
 def merge_maps(maps):
-    merged_map = dict()
+    # Accumulate each user's groups in a dict, used as an ordered set, so each group is only hashed once
+    merged_groups = dict()
     for projectmap in maps:
-        for key in projectmap.keys():
-            if key in merged_map:
-                merged_map[key] = _deduplicate_list(merged_map[key] + projectmap[key])
-            else:
-                merged_map[key] = projectmap[key]
-    return merged_map
+        for key, groups in projectmap.items():
+            merged_groups.setdefault(key, dict()).update(dict.fromkeys(groups))
+    return {key: list(groups) for key, groups in merged_groups.items()}
 
 
 def print_usermap_to_file(osguser_groups, file):
-    for osguser, groups in sorted(osguser_groups.items()):
-        print("* {} {}".format(osguser, ",".join(group.strip() for group in groups)), file=file)
+    # Build the whole mapfile up front so it goes out in a few large writes rather than one per user
+    lines = ["* " + osguser + " " + ",".join(groups) + "\n"
+             for osguser, groups in sorted(osguser_groups.items())]
+    file.writelines(lines)
+
+
+def _copy_file_permissions(path, fd):
+    """ Give the file open at fd the mode and ownership of path, or the default mode for a new file
+    if path does not exist yet.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.fchmod(fd, 0o666 & ~umask)
+        return
+    os.fchmod(fd, st.st_mode & 0o7777)
+    try:
+        os.fchown(fd, st.st_uid, st.st_gid)
+    except PermissionError:
+        # Only root can give away a file; keep our own ownership otherwise
+        pass
 
 
 def print_usermap(osguser_groups):
     if options.outfile:
-        with open(options.outfile, "w") as w:
-            print_usermap_to_file(osguser_groups, w)
+        # Write to a temporary file next to the real (symlink-resolved) outfile and move it into place,
+        # so readers never see a partially written mapfile
+        outfile = os.path.realpath(options.outfile)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(outfile), prefix=".usermap-",
+                                         buffering=1 << 20, delete=False) as w:
+            tmp_outfile = w.name
+            try:
+                print_usermap_to_file(osguser_groups, w)
+                w.flush()
+                _copy_file_permissions(outfile, w.fileno())
+                os.fsync(w.fileno())
+            except BaseException:
+                w.close()
+                os.unlink(tmp_outfile)
+                raise
+        try:
+            os.replace(tmp_outfile, outfile)
+        except BaseException:
+            os.unlink(tmp_outfile)
+            raise
     else:
         print_usermap_to_file(osguser_groups, sys.stdout)
 
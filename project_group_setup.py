@@ -3,6 +3,7 @@
 import os
 import sys
 import getopt
+from concurrent.futures import ThreadPoolExecutor
 import comanage_utils as utils
 
 SCRIPT = os.path.basename(__file__)
@@ -135,8 +136,15 @@ def get_comanage_data():
     highest_osggid = 0
 
     co_groups = utils.get_osg_co_groups(options.osg_co_id, options.endpoint, options.authstr)["CoGroups"]
-    for group_data in co_groups:
-        identifier_list = utils.get_co_group_identifiers(group_data["Id"], options.endpoint, options.authstr)
+
+    # Fetch the identifiers for every group concurrently; these calls are latency-bound
+    def fetch_identifiers(group_data):
+        return utils.get_co_group_identifiers(group_data["Id"], options.endpoint, options.authstr)
+
+    with ThreadPoolExecutor(max_workers=utils.MAX_API_WORKERS) as executor:
+        identifier_lists = list(executor.map(fetch_identifiers, co_groups))
+
+    for group_data, identifier_list in zip(co_groups, identifier_lists):
         if identifier_list is not None:
             # Store this groups data in a dictionary to avoid repeated API calls
             group = {"Gid": group_data["Id"], "Name": group_data["Name"], "ID_List": identifier_list["Identifiers"]}
@@ -184,22 +192,29 @@ def get_projects_needing_provisioning(project_groups):
     # project groups provisioned in LDAP
     ldap_group_osggids = utils.get_ldap_groups(options.ldap_server, options.ldap_user, options.ldap_authtok)
     try:
+        # osggid of each project, looked up once
+        project_osggid_pairs = [
+            (project, int(utils.identifier_from_list(project["ID_List"], "osggid"))) for project in project_groups
+        ]
         # All project osggids
-        project_osggids = set(
-            int(utils.identifier_from_list(project["ID_List"], "osggid")) for project in project_groups
-        )
+        project_osggids = set(osggid for _, osggid in project_osggid_pairs)
         # project osggids not provisioned in ldap
         project_osggids_to_provision = project_osggids.difference(ldap_group_osggids)
         # All projects that aren't provisioned in ldap
         projects_to_provision = (
             project
-            for project in project_groups
-            if int(utils.identifier_from_list(project["ID_List"], "osggid")) in project_osggids_to_provision
+            for project, osggid in project_osggid_pairs
+            if osggid in project_osggids_to_provision
         )
         return projects_to_provision
     except TypeError:
+        projects_lacking_osggids = [
+            (project["Gid"], project["Name"])
+            for project in project_groups
+            if utils.identifier_from_list(project["ID_List"], "osggid") is None
+        ]
         print("TypeError raised while trying to determine which projects need provisioning\n"
-              +f"ldap group osggids: {ldap_group_osggids} and project osggids: {project_osggids}")
+              +f"ldap group osggids: {ldap_group_osggids} and projects lacking osggids (Gid, Name): {projects_lacking_osggids}")
         return set()
 
 